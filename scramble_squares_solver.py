@@ -3,19 +3,37 @@
 Solve the 'Scramble Squares' class of puzzles.
 """
 
+import csv
 import itertools
 from dataclasses import dataclass
-from collections import Counter
+from typing import Optional
+import multiprocessing
 import random
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# numpy and numba are only imported by _load_numba, on the first compiled
+# solve, so that importing this module stays fast
+np = None
 
 
 @dataclass
 class Globals:
     USE_RARES: bool = True
+    # no longer used: extending only the most constrained Loc never
+    # reaches a partial Board twice, so there is nothing to memoize
     MEMOIZE: bool = True
     FIRST_ONLY: bool = True
     LOG_FREQUENCY: int = 2500
+    # a trial of the compiled core is a single (tile, rotation) probe, far
+    # cheaper and more frequent than a Python search trial
+    COMPILED_LOG_FREQUENCY: int = 10000000
     DETERMINISTIC: bool = True
+    # the compiled core is slower than the Python search on the puzzles
+    # tried so far, as well as costly to import and compile
+    USE_NUMBA: bool = False
+    PARALLEL: bool = False
+    WORKERS: Optional[int] = None
 
 
 class Loc:
@@ -24,26 +42,37 @@ class Loc:
     and a dict of direction names, each of which will be mapped to a 
     destination (neighbor) Loc.
     """
+    __slots__ = ('direction_map', 'coord', 'dests', 'boundary_mask',
+                 '_neighbors', '_neighbor_dirs')
+
     def __init__(self, coord=None):
         self.direction_map = {}
         self.coord = (None, None) if coord is None else coord
+        # neighbors in the order of a Layout's directions, set by the Layout
+        self.dests = ()
+        # bit i is set when direction i of the Layout is an outer edge
+        self.boundary_mask = 0
+        self._neighbors = ()
+        self._neighbor_dirs = ()
 
     def set_dir(self, direction, dest=None):
         """ Set the neighboring Loc that corresponds to the specified direction. """
         self.direction_map[direction] = dest
+        # neighbors only change here, so cache them for the getters below;
+        # tuples, so that callers cannot alter the cache
+        self._neighbors = tuple(d for d in self.direction_map.values() if d)
+        self._neighbor_dirs = tuple(direction for direction, d
+                                    in self.direction_map.items() if d)
 
     def get_dest(self, direction):
         """ Get the neighboring Loc that corresponds to the specified direction. """
         return self.direction_map.get(direction, None)
     
     def get_neighbors(self):
-        return [self.direction_map[direction] 
-                for direction, _ in self.direction_map.items() 
-                if self.direction_map.get(direction, None)]
+        return self._neighbors
 
     def get_neighbor_dirs(self):
-        return [direction for direction in self.direction_map.keys() 
-                if self.direction_map.get(direction, None)]
+        return self._neighbor_dirs
 
     def __str__(self):
         return f'Loc {self.coord}'
@@ -72,6 +101,8 @@ class Layout:
             self.coords = coords
         for coord in self.coords:
             self.loc_dict[coord] = Loc(coord)
+        # the locs never change, so keep them as a tuple for indexing
+        self._locs = tuple(self.loc_dict.values())
 
         if direction_map is None:
             self.direction_map = {
@@ -79,6 +110,8 @@ class Layout:
                     }
         else:
             self.direction_map = direction_map
+        self.directions_ordered = list(self.direction_map)
+        self._dir_idx = {d: i for i, d in enumerate(self.directions_ordered)}
 
         # construct direction pairs from the direction map        
         reverse_direction_map = {v: k for k, v in self.direction_map.items()}
@@ -86,6 +119,8 @@ class Layout:
         for direction, dirvec in self.direction_map.items():
             reverse_dirvec = tuple(-1 * d for d in dirvec)
             self.direction_pairs[direction] = reverse_direction_map[reverse_dirvec]
+        self.paired_idx = tuple(self._dir_idx[self.direction_pairs[d]]
+                                for d in self.directions_ordered)
 
         self.inner_edges = 0
         for loc in self.locs:
@@ -96,10 +131,23 @@ class Layout:
                         else None)
                 loc.set_dir(direction, dest)
                 self.inner_edges += 1 if dest else 0
+            loc.dests = tuple(loc.get_dest(d) for d in self.directions_ordered)
+            loc.boundary_mask = sum(1 << i for i, dest in enumerate(loc.dests)
+                                    if dest is None)
+
+        # whether every loc can be reached from every other through neighbors
+        reached = {self._locs[0]} if self._locs else set()
+        frontier = list(reached)
+        while frontier:
+            for dest in frontier.pop().get_neighbors():
+                if dest not in reached:
+                    reached.add(dest)
+                    frontier.append(dest)
+        self.connected = len(reached) == len(self._locs)
 
     @property
     def locs(self):
-        return self.loc_dict.values()
+        return self._locs
 
     def get_paired_dir(self, dir):
         return self.direction_pairs.get(dir, None)
@@ -111,7 +159,7 @@ class Layout:
 
 class Symbol:
     """Class to represent attributes of each symbol contained on a Tile."""
-    _rare_dict = {}
+    __slots__ = ('sym_type', 'side', '_sym', 'rare')
 
     def __init__(self, sym_type, side, rare=False):
         self.sym_type = sym_type
@@ -119,14 +167,6 @@ class Symbol:
         self._sym = (sym_type, side)
         self.rare = rare
 
-    @property
-    def rare(self):
-        return Symbol._rare_dict.get(self._sym, None)
-
-    @rare.setter
-    def rare(self, rare):
-        Symbol._rare_dict[self._sym] = rare
-
     def __eq__(self, other):
         return self._sym == other._sym
 
@@ -144,6 +184,8 @@ class Tile:
     directions is a list that must be in sequential order of rotations.
     symbols is a list that must be in order corresponding to directions.
     """
+    __slots__ = ('tile_id', 'directions', 'symbols',
+                 '_dir_idx', '_sym_by_rot', '_rots_for_sym')
     id_gen = itertools.count()
 
     def __init__(self, tile_id=None, directions=None, symbols=None):
@@ -152,6 +194,25 @@ class Tile:
                            else directions)
         self.symbols = ([None for d in self.directions] if symbols is None 
                         else symbols)
+        self._build_tables()
+
+    def _build_tables(self):
+        """
+        Precompute the symbol found in each direction for each rotation, and
+        the rotations that place each symbol into each direction, so that
+        the lookup helpers below need no list scans.
+        """
+        n = len(self.directions)
+        self._dir_idx = {d: i for i, d in enumerate(self.directions)}
+        self._sym_by_rot = [tuple(self.symbols[(i - r) % n] for i in range(n))
+                            for r in range(n)]
+        sym_idxs = {}
+        for i, s in enumerate(self.symbols):
+            sym_idxs.setdefault(s, []).append(i)
+        # keyed by (symbol, direction), as neither changes after construction
+        self._rots_for_sym = {(s, direction): tuple((d - i) % n for i in idxs)
+                              for s, idxs in sym_idxs.items()
+                              for d, direction in enumerate(self.directions)}
 
     def get_dir(self, symbol, rotation=0):
         """Get the direction corresponding to the given symbol and rotation."""
@@ -160,19 +221,18 @@ class Tile:
 
     def get_symbol(self, direction, rotation=0):
         """Get the symbol corresponding to the given direction and rotation."""
-        idx = self.directions.index(direction)
-        return self.symbols[(idx - rotation) % len(self.directions)]
+        return self._sym_by_rot[rotation % len(self.directions)][
+                self._dir_idx[direction]]
 
     def get_rotations(self, symbol, dir):
         """
-        Returns a list of rotations (since a Tile can contain more
+        Returns a tuple of rotations (since a Tile can contain more
         than one instance of a symbol) that would be required to place
         each matching symbol into the specified direction.
         """
-        d = self.directions.index(dir)
-        return [(d - i) % len(self.directions)
-                for i, s in enumerate(self.symbols)
-                if s == symbol]
+        if dir not in self._dir_idx:
+            raise ValueError(f'{dir} is not a direction of {self}')
+        return self._rots_for_sym.get((symbol, dir), ())
 
     def set_symbol(self, symbol, direction=None):
         if direction:
@@ -180,6 +240,7 @@ class Tile:
             self.symbols[idx] = symbol
         else:
             self.symbols.append(symbol)
+        self._build_tables()
 
     def __lt__(self, other):
         return self.tile_id < other.tile_id
@@ -193,20 +254,22 @@ class Tile:
         return f'Tile {self.tile_id} ({symlist})'
 
 
-@dataclass(unsafe_hash=True)
+@dataclass
 class Assignment:
     """
     Class to represent an assignment of a specific Tile with specific
-    rotation to a specific Loc.
+    rotation to a specific Loc.  An Assignment with tile and rotation None
+    leaves its Loc empty, for a Game with fewer Tiles than Locs (see
+    Board.extend_board).
     """
+    __slots__ = ('loc', 'tile', 'rotation')
     loc: Loc
-    tile: Tile
-    rotation: int
-    validated: bool = False
+    tile: Optional[Tile]
+    rotation: Optional[int]
 
     def __repr__(self):
         return (f'Assignment ({self.loc} | {self.tile} | '
-                f'rot={self.rotation} | {self.validated})'
+                f'rot={self.rotation})'
                 )
 
 
@@ -217,46 +280,86 @@ class Board:
     consistent with each other (tile symbols match across edges).
     A solved Board is a validated Board that includes either all of the Locs
     or all of the Tiles in a Game (none remain available to be assigned).
+    During a search, a single Board is extended and backtracked in place
+    with push and pop.  When a Game has fewer Tiles than Locs, a search
+    may also push an Assignment with no tile, which leaves its Loc empty.
     """
     def __init__(self, game=None, assignments=None):
         self.game = game
-        self.assignments = [] if not assignments else assignments
+        self.assignments = []
+        # everything pushed, in order, including Locs left empty
+        self.decisions = []
+        # map of each assigned Loc to its Assignment (None if left empty),
+        # for O(1) lookups
+        self.loc_map = {}
+        # bitmap of the game's placements whose tile is still unassigned
+        self._open_placements = game.all_placements if game else 0
+        for assignment in assignments or []:
+            self.push(assignment)
+
+    def push(self, assignment):
+        """
+        Add an Assignment to the Board, or leave its Loc empty if it has no
+        tile.
+        """
+        self.decisions.append(assignment)
+        if assignment.tile is None:
+            self.loc_map[assignment.loc] = None
+            return
+        self.assignments.append(assignment)
+        self.loc_map[assignment.loc] = assignment
+        self._open_placements &= ~self.game.tile_placements[assignment.tile]
+
+    def pop(self):
+        """Remove and return the most recently pushed Assignment."""
+        assignment = self.decisions.pop()
+        del self.loc_map[assignment.loc]
+        if assignment.tile is not None:
+            self.assignments.pop()
+            self._open_placements |= self.game.tile_placements[
+                    assignment.tile]
+        return assignment
 
     def validate(self):
+        """
+        Check every Assignment on the Board against its neighbors.  Each
+        Assignment is checked, in order, only against the ones before it,
+        so every shared edge is compared once.
+        """
+        game = self.game
+        rot_syms = game.rot_syms
+        rare_masks = game.rare_masks
+        validators = game.validators
+        use_rares = Globals.USE_RARES
+        placed = {}
         for assignment in self.assignments:
-            if assignment.validated:
-                continue
-            # look at each direction of this assignment's tile
-            tile = assignment.tile
-            for direction in tile.directions:
-                sym = tile.get_symbol(direction, assignment.rotation)
-                # find the layout loc associated with the current direction
-                destloc = assignment.loc.get_dest(direction)
-                # rare symbols may not match an "edge" with no associated loc
-                if not destloc:
-                    if Globals.USE_RARES and sym.rare:
-                        return False
-                    else:
-                        continue
-                # find the assignment that is associated with the dest loc
-                destassign = next((da for da in self.assignments
-                                   if da.loc == destloc), None)
-                if not destassign:
-                    continue
-                # find the symbol in the reciprocal dir of the dest assignment
-                otherdir = self.game.layout.get_paired_dir(direction)
-                othertile = destassign.tile
-                othersym = othertile.get_symbol(otherdir, destassign.rotation)
-                # is the reciprocal sym the matching pair to the current sym?
-                if self.game.sympairs.get(sym, None) != othersym:
-                    return False
-            assignment.validated = True
+            tile, rotation = assignment.tile, assignment.rotation
+            if not validators[assignment.loc](
+                    rot_syms[tile][rotation], rare_masks[tile][rotation],
+                    placed.get, rot_syms, use_rares):
+                return False
+            placed[assignment.loc] = assignment
         return True
 
+    def validate_last(self):
+        """
+        Check only the most recently pushed Assignment against its neighbors.
+        The Assignments beneath it were checked as they were pushed, so this
+        is all a search needs to validate each new Board.  Uses the check
+        generated for the Assignment's Loc (see _generate_validator).
+        """
+        assignment = self.assignments[-1]
+        tile, rotation = assignment.tile, assignment.rotation
+        game = self.game
+        rot_syms = game.rot_syms
+        return game.validators[assignment.loc](
+                rot_syms[tile][rotation], game.rare_masks[tile][rotation],
+                self.loc_map.get, rot_syms, Globals.USE_RARES)
+
     def check_solved(self):
-        for assignment in self.assignments:
-            if not assignment.validated:
-                return False
+        """
+        Check whether a validated Board has used up all Locs or all Tiles.
+        """
         if (len(self.assignments) == len(self.game.tiles) or
             len(self.assignments) == len(self.game.layout.locs)):
             return True
@@ -265,55 +368,103 @@ class Board:
 
     def extend_board(self):
         """
-        Construct a list of next board candidates by finding all Assignment  
-        directions that point to an open Loc, then finding all matching Tiles  
-        that would fit that Assigment.
+        Generate the candidate Assignments that would extend this Board,
+        all at the single Loc chosen by _select_next_loc.  When the Game has
+        fewer Tiles than Locs, a solution can leave that Loc empty, so an
+        Assignment with no tile is also generated while there are Locs to
+        spare.
         """
-        next_boards = []
-        if Globals.DETERMINISTIC:
-            unassigned_tiles = list(set(self.game.tiles) -
-                                 {a.tile for a in self.assignments})
-            unassigned_tiles.sort()
-        else:
-            unassigned_tiles = (set(self.game.tiles) -
-                                 {a.tile for a in self.assignments})
+        loc, bits = self._select_next_loc()
+        if loc is None:
+            return
+        game = self.game
+        spare_locs = len(game.layout.locs) - len(game.tiles)
+        empty_locs = len(self.decisions) - len(self.assignments)
+        if self._open_placements and empty_locs < spare_locs:
+            yield Assignment(loc=loc, tile=None, rotation=None)
+        placements = game.placements
+        for p in _iter_bits(bits):
+            tile, rot = placements[p]
+            yield Assignment(loc=loc, tile=tile, rotation=rot)
 
-        for assignment in self.assignments:
-            if not assignment.validated:
-                raise ValueError(
-                        "Can only extend a Board that is fully validated.")
-            tile = assignment.tile
-            # look at each direction of this assignment's tile
-            for direction in tile.directions:
-                # find the layout loc associated with the current direction
-                destloc = assignment.loc.get_dest(direction)
-                if not destloc:
-                    continue
-                # is there an assignment already associated with the dest loc?
-                destassign = next((da for da in self.assignments 
-                                   if da.loc == destloc), None)
-                if destassign:
-                    continue
-                # which reciprocal dir and sym match the current dir and sym?
-                sym = tile.get_symbol(direction, assignment.rotation)
-                otherdir = self.game.layout.get_paired_dir(direction)
-                othersym = self.game.sympairs.get(sym, None)
-                if not othersym:
-                    continue
-                for othertile in unassigned_tiles:
-                    rots = othertile.get_rotations(othersym, otherdir)
-                    for rot in rots:
-                        newassign = Assignment(loc=destloc, tile=othertile,
-                                               rotation=rot, validated=False)
-                        next_boards.append(Board(self.game,
-                                                 self.assignments+[newassign]))
-        return next_boards
-
-    def memoize(self):
-        self.game.boards_visited.add(frozenset(self.assignments))
-
-    def check_memo(self):
-        return frozenset(self.assignments) in self.game.boards_visited
+    def _select_next_loc(self):
+        """
+        Choose the open Loc to extend and the bitmap of its placements: of
+        the open Locs next to an assigned one, the Loc that the fewest
+        unassigned Tiles would fit (most constrained first, ties going to
+        the earlier Loc in the Layout).  Always picking the Loc this way
+        (and either filling it or leaving it empty) means that no partial
+        Board can be reached twice.
+        Returns (None, 0) when no open Loc has an assigned neighbor.
+        """
+        loc_map = self.loc_map
+        placement_bits = self._placement_bits
+        open_bits = self._branch_placements()
+        best_loc, best_bits, best_count = None, 0, 0
+        for loc in self.game.layout.locs:
+            if loc in loc_map:
+                continue
+            bits = placement_bits(loc, open_bits)
+            if bits is None:
+                continue
+            count = bin(bits).count('1')
+            if best_loc is None or count < best_count:
+                best_loc, best_bits, best_count = loc, bits, count
+                if not count:
+                    break
+        return best_loc, best_bits
+
+    def get_placements(self, loc):
+        """
+        List the (tile, rotation) placements of unassigned Tiles that match
+        every assigned neighbor of an open Loc, or None if it has no
+        assigned neighbors.
+        """
+        bits = self._placement_bits(loc)
+        if bits is None:
+            return None
+        placements = self.game.placements
+        return [placements[p] for p in _iter_bits(bits)]
+
+    def _branch_placements(self):
+        """
+        Bitmap of the open placements worth branching on: of each group of
+        identical Tiles, only the first unassigned one is tried, since the
+        others would only repeat its subtree.
+        """
+        game = self.game
+        bits = self._open_placements & ~game.twin_placements
+        for group_bits in game.twin_group_placements:
+            open_group = self._open_placements & group_bits
+            if open_group:
+                tile, _ = game.placements[
+                        (open_group & -open_group).bit_length() - 1]
+                bits |= game.tile_placements[tile]
+        return bits
+
+    def _placement_bits(self, loc, open_bits=None):
+        # AND together the placements allowed by each assigned neighbor
+        if open_bits is None:
+            open_bits = self._open_placements
+        game = self.game
+        rot_syms = game.rot_syms
+        paired_idx = game.layout.paired_idx
+        get_destassign = self.loc_map.get
+        get_bits = game.placements_for.get
+        bits = None
+        for i, destloc in enumerate(loc.dests):
+            destassign = get_destassign(destloc)
+            if destassign is None:
+                continue
+            # which symbol does this neighbor require in this direction?
+            sym = -rot_syms[destassign.tile][
+                    destassign.rotation][paired_idx[i]]
+            bits = ((open_bits if bits is None else bits)
+                    & get_bits((sym, i), 0))
+        # leave out placements that would put a rare symbol on an outer edge
+        if bits and Globals.USE_RARES:
+            bits &= game.edge_placements[loc]
+        return bits
 
     def __str__(self):
         asgns = sorted(self.assignments, 
@@ -328,8 +479,8 @@ class Board:
 
 class Game:
     """
-    Class to track the state of a Game (Layout, Tiles, Board candidate stack
-    for solution in progress.)
+    Class to track the state of a Game (Layout, Tiles, stack of candidate
+    Assignments for the solution in progress.)
     """
     def __init__(self, layout=None, tiles=None):
         self.layout = Layout() if not layout else layout
@@ -337,89 +488,568 @@ class Game:
             raise ValueError('Tiles must be supplied at Game initialization.')
         else:
             self.tiles = tiles
-        self._symlist = list(
-                itertools.chain.from_iterable(p.symbols for p in self.tiles))
-        self._symfreq = Counter(self._symlist)
-        self.symbols = set(self._symlist)
-        self.boards_visited = set()
+        self._symfreq = {}
+        for tile in self.tiles:
+            for sym in tile.symbols:
+                self._symfreq[sym] = self._symfreq.get(sym, 0) + 1
+        self.symbols = set(self._symfreq)
         self.stack = []
+        self.tiles_sorted = sorted(self.tiles)
 
         if Globals.USE_RARES:
-            for sym in self.symbols:
-                if self._symfreq[sym] <= (self.layout.inner_edges
-                                / len(self.symbols)):
-                    sym.rare = True
+            rares = {sym for sym in self.symbols
+                     if self._symfreq[sym] <= (self.layout.inner_edges
+                                               / len(self.symbols))}
+            # flag every instance, since equal Symbols may be separate objects
+            for tile in self.tiles:
+                for sym in tile.symbols:
+                    sym.rare = sym in rares
 
         self.symsides = set(sym.side for sym in self.symbols)
         if len(self.symsides) != 2:
             raise ValueError(
                     f'There should be exactly two types of symbol sides. '
                     f'(e.g. "top" and "bottom").')
+        side_a, side_b = self.symsides
+        other_side = {side_a: side_b, side_b: side_a}
+        by_type_side = {(sym.sym_type, sym.side): sym for sym in self.symbols}
         self.sympairs = {}
         for sym in self.symbols:
-            otherside = next(
-                    (pair for pair in self.symbols
-                     if sym.sym_type == pair.sym_type and sym.side != pair.side)
-                    , None)
+            otherside = by_type_side.get((sym.sym_type, other_side[sym.side]))
             if otherside:
                 self.sympairs[sym] = otherside
 
+        # intern each symbol as a small int: one number per symbol type,
+        # negated on one side, so that matching symbols sum to zero
+        sym_types = sorted({sym.sym_type for sym in self.symbols}, key=str)
+        type_ids = {sym_type: i for i, sym_type in enumerate(sym_types, 1)}
+        side_signs = dict(zip(sorted(self.symsides, key=str), (1, -1)))
+        self.sym_ids = {sym: side_signs[sym.side] * type_ids[sym.sym_type]
+                        for sym in self.symbols}
+        self.rare_ids = {self.sym_ids[sym] for sym in self.symbols
+                         if sym.rare}
+
+        # the symbol ids of each tile rotation, by layout direction index
+        directions = self.layout.directions_ordered
+        self.rot_syms = {tile: [tuple(self.sym_ids[tile.get_symbol(d, rot)]
+                                      for d in directions)
+                                for rot in range(len(tile.directions))]
+                         for tile in self.tiles}
+
+        # number every (tile, rotation) placement in tile order; sets of
+        # placements are int bitmaps over these numbers: all of a tile's
+        # placements, and those that show each symbol id in each layout
+        # direction index, so candidates need no per-tile search
+        self.placements = [(tile, rot) for tile in self.tiles_sorted
+                           for rot in range(len(tile.directions))]
+        self.all_placements = (1 << len(self.placements)) - 1
+        self.tile_placements = {}
+        self.placements_for = {}
+        for p, (tile, rot) in enumerate(self.placements):
+            self.tile_placements[tile] = (self.tile_placements.get(tile, 0)
+                                          | 1 << p)
+            for i, sym in enumerate(self.rot_syms[tile][rot]):
+                self.placements_for[(sym, i)] = (
+                        self.placements_for.get((sym, i), 0) | 1 << p)
+
+        # bit i of each tile rotation's rare mask is set when a rare symbol
+        # faces layout direction i, so checking it against a Loc's
+        # boundary_mask is one AND; and for each loc, the placements that
+        # put no rare symbol on its outer edges
+        self.rare_masks = {tile: [sum(1 << i for i, sym in enumerate(syms)
+                                      if sym in self.rare_ids)
+                                  for syms in self.rot_syms[tile]]
+                           for tile in self.tiles}
+        self.edge_placements = {}
+        for loc in self.layout.locs:
+            self.edge_placements[loc] = sum(
+                    1 << p for p, (tile, rot) in enumerate(self.placements)
+                    if not self.rare_masks[tile][rot] & loc.boundary_mask)
+
+        # groups of identical Tiles (the same symbols, all around, under
+        # some rotation), in tile order; each Tile's rotation offset from the
+        # first of its group, so that the Tile at (rot + offset) % n shows
+        # what the first Tile shows at rot; and the placements of all
+        # grouped Tiles.  Whole tiles are compared, not just the symbols
+        # that face the Layout's directions.
+        tile_syms = {tile: [tuple(self.sym_ids[tile.get_symbol(d, rot)]
+                                  for d in tile.directions)
+                            for rot in range(len(tile.directions))]
+                     for tile in self.tiles}
+        by_canonical = {}
+        for tile in self.tiles_sorted:
+            by_canonical.setdefault((tuple(tile.directions),
+                                     min(tile_syms[tile])), []).append(tile)
+        self.twins = {}
+        self.twin_offset = {}
+        self.twin_group_placements = []
+        self.twin_placements = 0
+        for group in by_canonical.values():
+            if len(group) < 2:
+                continue
+            group = tuple(group)
+            group_bits = 0
+            for tile in group:
+                self.twins[tile] = group
+                self.twin_offset[tile] = tile_syms[tile].index(
+                        tile_syms[group[0]][0])
+                group_bits |= self.tile_placements[tile]
+            self.twin_group_placements.append(group_bits)
+            self.twin_placements |= group_bits
+
+        # straight-line validation code for an Assignment at each loc
+        self.validators = {loc: _generate_validator(loc,
+                                                    self.layout.paired_idx)
+                           for loc in self.layout.locs}
+
+    def expand_twins(self, board):
+        """
+        List the Board and every other Board made from it by swapping
+        identical Tiles, with rotations adjusted so that each Loc still
+        shows the same symbols.
+        """
+        # indexes of the assignments of each group of identical tiles
+        by_group = {}
+        for i, assignment in enumerate(board.assignments):
+            group = self.twins.get(assignment.tile)
+            if group:
+                by_group.setdefault(group, []).append(i)
+        boards = []
+        for choice in itertools.product(*(
+                itertools.permutations(group, len(idxs))
+                for group, idxs in by_group.items())):
+            assignments = list(board.assignments)
+            for idxs, tiles in zip(by_group.values(), choice):
+                for i, tile in zip(idxs, tiles):
+                    old = assignments[i]
+                    rotation = ((old.rotation - self.twin_offset[old.tile]
+                                 + self.twin_offset[tile])
+                                % len(tile.directions))
+                    assignments[i] = Assignment(loc=old.loc, tile=tile,
+                                                rotation=rotation)
+            boards.append(Board(self, assignments))
+        return boards
+
     def solve(self):
-        """Solve the game and return one or more Boards with valid solutions."""
+        """
+        Solve the game and return one or more Boards with valid solutions.
+        With FIRST_ONLY, returns the first solution found, or None if there
+        is none; otherwise a list of every solution.
+        """
+        if (Globals.USE_NUMBA
+                and len(self.tiles) >= len(self.layout.locs)
+                and self.layout.connected and _load_numba()):
+            return self._solve_compiled()
+        if Globals.PARALLEL:
+            warnings.warn('Globals.PARALLEL only applies to the compiled '
+                          'search (see Globals.USE_NUMBA); solving serially',
+                          RuntimeWarning)
+
         def print_update():
             print(f'solution_length: {len(board.assignments)}, '
                   f'trials: {trials}, valid_trials: {valid_trials}, '
                   f'stack depth = {len(self.stack)}')
-            print(f'boards visited: {len(self.boards_visited)}, '
-                  f'revisits: {revisits}')
 
-        trials, valid_trials, revisits = 0,0,0
+        trials, valid_trials = 0,0
         if not Globals.FIRST_ONLY:
             boards = []
 
         # Initialize the stack by placing all possible tile rotations
-        # onto one initial location.
+        # onto one initial location.  Each stack entry is an Assignment
+        # to try, and the number of Assignments on the Board it extends.
         if Globals.DETERMINISTIC:
-            loc = next(iter(self.layout.locs))
+            loc = self.layout.locs[0]
         else:
-            loc = random.choice(list(self.layout.locs))
-        for tile in self.tiles:
-            for rotation, _ in enumerate(tile.directions):
-                assignment = Assignment(loc=loc, tile=tile, 
-                               rotation=rotation, validated=False)
-                board = Board(self, [assignment])
-                self.stack.insert(0, board)
+            loc = random.choice(self.layout.locs)
+        # start from an empty Board and stack, even if solve ran before
+        board = Board(self)
+        self.stack = []
+        # of each group of identical tiles, only the first is seeded
+        seeds = [(Assignment(loc=loc, tile=tile, rotation=rotation), 0)
+                 for tile in self.tiles
+                 if self.twins.get(tile, (tile,))[0] is tile
+                 for rotation, _ in enumerate(tile.directions)]
+        # reversed, so that the first seed is the first one popped
+        self.stack.extend(reversed(seeds))
         if not Globals.DETERMINISTIC:
             random.shuffle(self.stack)
 
         while self.stack:
-            board = self.stack.pop()
+            assignment, depth = self.stack.pop()
+            # backtrack to the Board this assignment extends
+            while len(board.decisions) > depth:
+                board.pop()
+            board.push(assignment)
             trials += 1
             if trials % Globals.LOG_FREQUENCY == 0:
                 print_update()
-            if not board.validate():
+            if assignment.tile is not None and not board.validate_last():
                 continue
             valid_trials += 1
-            if Globals.MEMOIZE:
-                if board.check_memo():
-                    revisits += 1
-                    continue
-                else:
-                    board.memoize()
             if board.check_solved():
                 print_update()
                 if Globals.FIRST_ONLY:
                     return board
                 else:
-                    boards.append(board)
-            for new_board in board.extend_board():
-                self.stack.append(new_board)
+                    boards.extend(self.expand_twins(board))
+                # no Loc or no Tile is left to extend it with
+                continue
+            for new_assignment in board.extend_board():
+                self.stack.append((new_assignment, depth + 1))
         print_update()
         if Globals.FIRST_ONLY:
-            return board
+            return None
         else:
             return boards
 
+    def _solve_compiled(self):
+        """
+        Solve the game with the Numba-compiled search core.  Locs are filled
+        in a fixed breadth-first order from the initial loc, which is why
+        every loc must be able to receive a tile, and be reachable from the
+        initial loc (see Layout.connected).  Unlike the Python search, the
+        core neither picks the most constrained loc nor narrows candidates
+        with the placement bitmaps: it probes every (tile, rotation), which
+        is why it is only used when USE_NUMBA is set.
+        """
+        def print_update():
+            print(f'search depth: {state[0]}, '
+                  f'trials: {state[1]}, valid_trials: {state[2]}')
+
+        if not Globals.FIRST_ONLY:
+            boards = []
+        if Globals.DETERMINISTIC:
+            loc = self.layout.locs[0]
+            tiles = list(self.tiles)
+        else:
+            loc = random.choice(self.layout.locs)
+            tiles = random.sample(self.tiles, len(self.tiles))
+        locs, tables = _compile_game(tiles, self.layout, self.rot_syms,
+                                     self.rare_ids, loc)
+        if Globals.PARALLEL:
+            return self._solve_parallel(locs, tiles, tables)
+
+        tile_at, rot_at, cand, used, state = _new_search_state(tables)
+        while True:
+            found = _search(*tables, Globals.USE_RARES, tile_at, rot_at,
+                            cand, used, state, 0,
+                            state[1] + Globals.COMPILED_LOG_FREQUENCY)
+            if found < 0:
+                print_update()
+                continue
+            if not found:
+                break
+            board = self._compiled_board(locs, tiles, tile_at, rot_at)
+            print_update()
+            if Globals.FIRST_ONLY:
+                return board
+            boards.append(board)
+        print_update()
+        if Globals.FIRST_ONLY:
+            return None
+        else:
+            return boards
+
+    def _solve_parallel(self, locs, tiles, tables):
+        """
+        Search the subtree below each tile rotation on the initial loc in a
+        separate worker process.  With FIRST_ONLY, the first solution found
+        is returned and the remaining subtrees are cancelled: queued ones
+        never start, and running ones stop at their next check of a shared
+        stop event.  With DETERMINISTIC, subtrees are awaited in seed order,
+        so the solution returned is the first in seed order rather than
+        whichever worker finishes first.
+        """
+        def print_update():
+            print(f'solution_length: {len(board.assignments)}, '
+                  f'trials: {trials}, valid_trials: {valid_trials}, '
+                  f'subtrees searched: {done} of {len(futures)}')
+
+        trials, valid_trials, done = 0, 0, 0
+        solutions = []
+        board = Board(self)
+        seeds = list(range(tables[0].shape[0] * tables[0].shape[1]))
+        if not Globals.DETERMINISTIC:
+            random.shuffle(seeds)
+        stop = multiprocessing.Event()
+        executor = ProcessPoolExecutor(Globals.WORKERS,
+                                       initializer=_init_worker,
+                                       initargs=(stop,))
+        try:
+            futures = {executor.submit(_search_seed, tables, seed,
+                                       Globals.USE_RARES, Globals.FIRST_ONLY):
+                       seed for seed in seeds}
+            if Globals.DETERMINISTIC:
+                pending = list(futures)
+            else:
+                pending = as_completed(futures)
+            for future in pending:
+                found, seed_trials, seed_valid_trials = future.result()
+                trials += seed_trials
+                valid_trials += seed_valid_trials
+                done += 1
+                solutions.extend((futures[future], tile_at, rot_at)
+                                 for tile_at, rot_at in found)
+                if found and Globals.FIRST_ONLY:
+                    break
+        finally:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+        # report solutions in seed order, whichever worker finished first
+        solutions.sort(key=lambda solution: solution[0])
+        boards = [self._compiled_board(locs, tiles, tile_at, rot_at)
+                  for _, tile_at, rot_at in solutions]
+        if boards:
+            board = boards[0]
+        print_update()
+        if Globals.FIRST_ONLY:
+            return boards[0] if boards else None
+        else:
+            return boards
+
+    def _compiled_board(self, locs, tiles, tile_at, rot_at):
+        """Build a Board from the tile and rotation arrays of the core."""
+        return Board(self, [Assignment(loc=loc, tile=tiles[tile_at[i]],
+                                       rotation=int(rot_at[i]))
+                            for i, loc in enumerate(locs)])
+
+
+def _iter_bits(bits):
+    """Yield the index of each set bit of an int, lowest first."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def _generate_validator(loc, paired_idx):
+    """
+    Generate a function that checks an Assignment at the given Loc, with the
+    Loc's edges and neighbors unrolled into straight-line code, e.g. for
+    the top-left loc of a 3x3 layout:
+
+        def validate_loc(syms, rare_mask, get_destassign, rot_syms, use_rares):
+            if use_rares and rare_mask & 9:
+                return False
+            a = get_destassign(dest_1)
+            if a is not None and syms[1] + rot_syms[a.tile][a.rotation][0]:
+                return False
+            ...
+            return True
+
+    syms are the symbol ids of the Assignment's tile rotation, rare_mask its
+    rare symbol directions (see Game.rare_masks), and get_destassign maps a
+    neighboring Loc to its Assignment (or None).
+    """
+    lines = ['def validate_loc(syms, rare_mask, get_destassign, rot_syms, '
+             'use_rares):']
+    if loc.boundary_mask:
+        lines += [f'    if use_rares and rare_mask & {loc.boundary_mask}:',
+                  '        return False']
+    for i, dest in enumerate(loc.dests):
+        if dest is None:
+            continue
+        lines += [f'    a = get_destassign(dest_{i})',
+                  f'    if a is not None and (syms[{i}] + rot_syms[a.tile]'
+                  f'[a.rotation][{paired_idx[i]}]):',
+                  '        return False']
+    lines.append('    return True')
+    namespace = {f'dest_{i}': dest for i, dest in enumerate(loc.dests)}
+    exec('\n'.join(lines), namespace)
+    return namespace['validate_loc']
+
+
+def _compile_game(tiles, layout, rot_syms, rare_ids, first_loc):
+    """
+    Encode a Game as small integer arrays for the compiled search core.
+    Returns the Locs in fill order (breadth-first from first_loc) and the
+    tuple of tables expected by _search:
+    tiles_sym[tile, rotation, dir] signed symbol id found in a layout
+    direction, copied from Game.rot_syms,
+    tiles_rare[tile, rotation, dir] 1 if that symbol is rare,
+    neighbors[loc, dir] index of the neighboring loc (-1 at an edge),
+    paired_dir[dir] index of the reciprocal direction.
+    """
+    # breadth-first fill order, with loc_idx doubling as the visited set
+    locs = [first_loc]
+    loc_idx = {first_loc: 0}
+    for loc in locs:
+        for dest in loc.get_neighbors():
+            if dest not in loc_idx:
+                loc_idx[dest] = len(locs)
+                locs.append(dest)
+
+    tiles_sym = np.array([rot_syms[tile] for tile in tiles], dtype=np.int16)
+    tiles_rare = np.array([[[sym in rare_ids for sym in syms]
+                            for syms in rot_syms[tile]] for tile in tiles],
+                          dtype=np.int8)
+    neighbors = np.array([[loc_idx.get(dest, -1) for dest in loc.dests]
+                          for loc in locs], dtype=np.int16)
+    paired_dir = np.array(layout.paired_idx, dtype=np.int16)
+    return locs, (tiles_sym, tiles_rare, neighbors, paired_dir,
+                  min(len(tiles), len(locs)))
+
+
+def _new_search_state(tables):
+    """
+    Allocate the arrays _search works in: the tile and rotation at each loc,
+    the next candidate to try at each depth, which tiles are in use, and
+    (depth, trials, valid_trials).
+    """
+    num_tiles, num_locs = tables[0].shape[0], tables[2].shape[0]
+    tile_at = np.full(num_locs, -1, dtype=np.int16)
+    rot_at = np.zeros(num_locs, dtype=np.int16)
+    cand = np.zeros(num_locs, dtype=np.int64)
+    used = np.zeros(num_tiles, dtype=np.int8)
+    state = np.zeros(3, dtype=np.int64)
+    return tile_at, rot_at, cand, used, state
+
+
+# trials _search_seed runs between checks of the stop event
+_STOP_CHECK_TRIALS = 100000
+
+# set in each worker process of a parallel solve, to stop its search early
+_stop_event = None
+
+
+def _init_worker(stop_event):
+    """
+    Keep the stop event of a parallel solve in a worker process, and load
+    the compiled core there (a spawned worker starts from a fresh import).
+    """
+    global _stop_event
+    _stop_event = stop_event
+    _load_numba()
+
+
+def _search_seed(tables, seed, use_rares, first_only):
+    """
+    Search the subtree below one candidate (tile * rotations + rotation) on
+    the first loc; the unit of work for a parallel solve.  Returns a list of
+    (tile_at, rot_at) solutions, and the trial counts.  The search runs in
+    slices of _STOP_CHECK_TRIALS trials, and gives up early once the stop
+    event is set.
+    """
+    tile_at, rot_at, cand, used, state = _new_search_state(tables)
+    found = []
+    tile, rot = divmod(seed, tables[0].shape[1])
+    state[1] = 1
+    if not _fits(*tables[:4], use_rares, tile_at, rot_at, 0, tile, rot):
+        return found, state[1], state[2]
+    state[0], state[2] = 1, 1
+    tile_at[0], rot_at[0], used[tile] = tile, rot, 1
+    if tables[4] == 1:
+        return [(tile_at, rot_at)], state[1], state[2]
+    while _stop_event is None or not _stop_event.is_set():
+        result = _search(*tables, use_rares, tile_at, rot_at, cand, used,
+                         state, 1, state[1] + _STOP_CHECK_TRIALS)
+        if result < 0:
+            continue
+        if not result:
+            break
+        found.append((tile_at.copy(), rot_at.copy()))
+        if first_only:
+            break
+    return found, state[1], state[2]
+
+
+def _fits(tiles_sym, tiles_rare, neighbors, paired_dir, use_rares,
+          tile_at, rot_at, loc, tile, rot):
+    """Check a tile / rotation at a loc against the already placed tiles."""
+    for d in range(neighbors.shape[1]):
+        sym = tiles_sym[tile, rot, d]
+        dest = neighbors[loc, d]
+        # rare symbols may not match an "edge" with no associated loc
+        if dest < 0:
+            if use_rares and tiles_rare[tile, rot, d]:
+                return False
+            continue
+        othertile = tile_at[dest]
+        if othertile < 0:
+            continue
+        if sym + tiles_sym[othertile, rot_at[dest], paired_dir[d]] != 0:
+            return False
+    return True
+
+
+def _search(tiles_sym, tiles_rare, neighbors, paired_dir,
+            num_places, use_rares, tile_at, rot_at, cand, used, state,
+            min_depth, max_trials):
+    """
+    Iterative depth-first search over int arrays, filling loc i at depth i.
+    cand[depth] is the next (tile * rotations + rotation) to try at a depth,
+    and state holds (depth, trials, valid_trials), so a call resumes where
+    the previous one returned.  Placements below min_depth are left alone.
+    Returns 1 when tile_at / rot_at hold a solution, 0 when the search is
+    exhausted, and -1 once max_trials is hit.
+    """
+    num_rots = tiles_sym.shape[1]
+    num_cands = tiles_sym.shape[0] * num_rots
+    depth, trials, valid_trials = state[0], state[1], state[2]
+    while depth >= min_depth:
+        if trials >= max_trials:
+            state[0], state[1], state[2] = depth, trials, valid_trials
+            return -1
+        # take back the tile currently placed at this depth, if any
+        tile = tile_at[depth]
+        if tile >= 0:
+            used[tile] = 0
+            tile_at[depth] = -1
+        placed = False
+        c = cand[depth]
+        while c < num_cands:
+            tile, rot = c // num_rots, c % num_rots
+            if used[tile]:
+                # skip the remaining rotations of an assigned tile
+                c = (tile + 1) * num_rots
+                continue
+            c += 1
+            trials += 1
+            if _fits(tiles_sym, tiles_rare, neighbors, paired_dir,
+                     use_rares, tile_at, rot_at, depth, tile, rot):
+                valid_trials += 1
+                used[tile] = 1
+                tile_at[depth] = tile
+                rot_at[depth] = rot
+                placed = True
+                break
+        if not placed:
+            cand[depth] = 0
+            depth -= 1
+            continue
+        cand[depth] = c
+        if depth + 1 == num_places:
+            state[0], state[1], state[2] = depth, trials, valid_trials
+            return 1
+        depth += 1
+    state[0], state[1], state[2] = depth, trials, valid_trials
+    return 0
+
+
+# None until _load_numba first runs, then whether numba is installed
+_numba_loaded = None
+
+
+def _load_numba():
+    """
+    Import numpy and numba and compile _fits and _search, the first time it
+    is called.  Returns whether numba is installed; if not, the caller falls
+    back to the pure Python search.
+    """
+    global np, _fits, _search, _numba_loaded
+    if _numba_loaded is None:
+        try:
+            import numpy
+            from numba import njit
+        except ImportError:
+            _numba_loaded = False
+        else:
+            np = numpy
+            _fits = njit(cache=True)(_fits)
+            _search = njit(cache=True)(_search)
+            _numba_loaded = True
+    return _numba_loaded
+
 
 def csv2tiles(filename):
     """
@@ -431,16 +1061,21 @@ def csv2tiles(filename):
     a "/" separator: first the name of the symbol, then the name of the symbol's
     side. (e.g. "green clover/left", "orange star/right", "yellow moon/left").
     """
-    import pandas
-    df = pandas.read_csv(filename)
+    with open(filename, newline='') as f:
+        rows = [row for row in csv.reader(f) if row]
+    # like a spreadsheet column, IDs are numbers only if they all are
+    tile_ids = [row[0] for row in rows[1:]]
+    try:
+        tile_ids = [int(tile_id) for tile_id in tile_ids]
+    except ValueError:
+        pass
     tiles = []
-    for _, row in df.iterrows():
-        symbol_row = list(row[1:5])
+    for tile_id, row in zip(tile_ids, rows[1:]):
         symbols = []
-        for symbol_string in symbol_row:
+        for symbol_string in row[1:5]:
             sym_type, _, sym_side = symbol_string.partition('/')
             symbols.append(Symbol(sym_type=sym_type, side=sym_side))
-        new_tile = Tile(tile_id=row[0],
+        new_tile = Tile(tile_id=tile_id,
                   symbols=symbols)
         tiles.append(new_tile)
     return tiles
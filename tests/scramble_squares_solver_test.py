@@ -2,10 +2,13 @@
 """
 Test suite for scramble_squares_solver.py
 """
+import multiprocessing
+import os
 import pytest
 import sys
 
 sys.path.append("..")
+import scramble_squares_solver
 from scramble_squares_solver import *
 
 
@@ -36,13 +39,13 @@ def test_loc_get_dest(locs_2x1):
 
 def test_loc_get_neighbors(locs_2x1):
     locs = locs_2x1
-    assert locs[0].get_neighbors() == [locs[1]]
-    assert locs[1].get_neighbors() == [locs[0]]
+    assert locs[0].get_neighbors() == (locs[1],)
+    assert locs[1].get_neighbors() == (locs[0],)
 
 def test_loc_get_neighbor_dirs(locs_2x1):
     locs = locs_2x1
-    assert locs[0].get_neighbor_dirs() == ['e']
-    assert locs[1].get_neighbor_dirs() == ['w']
+    assert locs[0].get_neighbor_dirs() == ('e',)
+    assert locs[1].get_neighbor_dirs() == ('w',)
 
 
 ### Layout tests ###
@@ -77,8 +80,8 @@ def layout_default():
 def test_layout_locs(layout_2x1, layout_2x2_diag, layout_default):
     locs = list(layout_2x1.locs)
     assert len(locs) == 2
-    assert locs[0].get_neighbors() == [locs[1]]
-    assert locs[1].get_neighbors() == [locs[0]]
+    assert locs[0].get_neighbors() == (locs[1],)
+    assert locs[1].get_neighbors() == (locs[0],)
 
     locs = list(layout_2x2_diag.locs)
     assert len(locs) == 4
@@ -91,6 +94,13 @@ def test_layout_locs(layout_2x1, layout_2x2_diag, layout_default):
     # for a default 3x3 layout, there is only one "middle" piece with 4 neighbors
     assert len([loc for loc in locs if len(loc.get_neighbors()) == 4]) == 1
 
+def test_layout_connected(layout_2x1, layout_2x2_diag, layout_default):
+    assert layout_2x1.connected
+    assert layout_2x2_diag.connected
+    assert layout_default.connected
+    # rows of a grid wired only e and w are not joined to each other
+    assert not Layout('2x2', {'e':(1, 0), 'w':(-1, 0)}).connected
+
 def test_inner_edges(layout_2x1, layout_2x2_diag, layout_default):
     assert layout_2x1.inner_edges == 2
     assert layout_2x2_diag.inner_edges == 8
@@ -107,4 +117,305 @@ def test_layout_get_paired_dir(layout_2x1, layout_2x2_diag, layout_default):
     assert layout_default.get_paired_dir('s') == 'n'
     assert layout_default.get_paired_dir('clockwise') is None
 
+def test_layout_paired_idx(layout_2x1, layout_default):
+    assert layout_2x1.paired_idx == (1, 0)
+    # default directions are ordered n, s, e, w
+    assert layout_default.paired_idx == (1, 0, 3, 2)
+    for loc in layout_default.locs:
+        assert loc.dests == tuple(loc.get_dest(d)
+                                  for d in layout_default.directions_ordered)
+
+def test_layout_boundary_mask(layout_2x1, layout_default):
+    locs = list(layout_2x1.locs)
+    # directions are ordered e, w
+    assert locs[0].boundary_mask == 0b10
+    assert locs[1].boundary_mask == 0b01
+    # only the center of the default 3x3 layout has no outer edge
+    assert [loc.boundary_mask == 0 for loc in layout_default.locs] == \
+            [False] * 4 + [True] + [False] * 4
+
+
+### Tile tests ###
+
+@pytest.fixture
+def tile_abac():
+    syms = [Symbol('a', 'top'), Symbol('b', 'top'),
+            Symbol('a', 'top'), Symbol('c', 'bottom')]
+    return Tile(tile_id=0, symbols=syms)
+
+def test_tile_get_symbol(tile_abac):
+    tile = tile_abac
+    assert tile.get_symbol('n') == Symbol('a', 'top')
+    assert tile.get_symbol('w') == Symbol('c', 'bottom')
+    assert tile.get_symbol('n', 1) == Symbol('c', 'bottom')
+    assert tile.get_symbol('e', 1) == Symbol('a', 'top')
+    assert tile.get_symbol('e', 3) == Symbol('a', 'top')
+    # rotations wrap around
+    assert tile.get_symbol('n', 5) == tile.get_symbol('n', 1)
+
+def test_tile_get_rotations(tile_abac):
+    tile = tile_abac
+    assert sorted(tile.get_rotations(Symbol('a', 'top'), 'n')) == [0, 2]
+    assert tile.get_rotations(Symbol('c', 'bottom'), 'n') == (1,)
+    assert tile.get_rotations(Symbol('b', 'top'), 's') == (1,)
+    assert tile.get_rotations(Symbol('b', 'bottom'), 's') == ()
+    with pytest.raises(ValueError):
+        tile.get_rotations(Symbol('a', 'top'), 'north')
+
+def test_tile_set_symbol(tile_abac):
+    tile = tile_abac
+    tile.set_symbol(Symbol('d', 'bottom'), 'e')
+    assert tile.get_symbol('s', 1) == Symbol('d', 'bottom')
+    assert tile.get_rotations(Symbol('d', 'bottom'), 'w') == (2,)
+    assert tile.get_rotations(Symbol('b', 'top'), 'n') == ()
+
+
+### Game tests ###
+
+@pytest.fixture
+def tiles_wizards():
+    rows = ['R/B,G/B,B/T,W/T', 'W/T,R/T,G/T,B/B', 'B/T,R/T,G/B,W/T',
+            'R/T,G/T,W/B,B/T', 'R/B,W/B,G/T,B/B', 'R/T,B/B,W/B,G/T',
+            'G/T,R/T,B/T,W/T', 'W/T,B/T,G/B,R/T', 'G/T,R/B,B/T,W/T']
+    tiles = []
+    for tile_id, row in enumerate(rows):
+        symbols = [Symbol(*s.split('/')) for s in row.split(',')]
+        tiles.append(Tile(tile_id=tile_id, symbols=symbols))
+    return tiles
+
+def test_csv2tiles(tiles_wizards):
+    filename = os.path.join(os.path.dirname(__file__), '..', 'examples',
+                            'scsq_wizards.csv')
+    tiles = csv2tiles(filename)
+    assert [tile.tile_id for tile in tiles] == list(range(9))
+    for tile, expected in zip(tiles, tiles_wizards):
+        assert tile.symbols == expected.symbols
+
+def test_csv2tiles_string_ids(tmp_path):
+    filename = tmp_path / 'tiles.csv'
+    filename.write_text('ID,n,e,s,w\nA1,R/B,G/B,B/T,W/T\n2,W/T,R/T,G/T,B/B\n')
+    tiles = csv2tiles(filename)
+    assert [tile.tile_id for tile in tiles] == ['A1', '2']
+
+def test_game_sym_ids(tiles_wizards):
+    game = Game(tiles=tiles_wizards)
+    for sym, other in game.sympairs.items():
+        assert game.sym_ids[sym] + game.sym_ids[other] == 0
+    assert len(set(game.sym_ids.values())) == len(game.symbols)
+
+def check_solution(board):
+    return board.validate() and board.check_solved()
+
+def distinct_solutions(solutions):
+    return {frozenset((a.loc, a.tile, a.rotation)
+                      for a in solution.assignments)
+            for solution in solutions}
+
+@pytest.mark.parametrize('use_numba', [True, False])
+def test_game_solve(tiles_wizards, use_numba, monkeypatch):
+    monkeypatch.setattr(Globals, 'USE_NUMBA', use_numba)
+    solution = Game(tiles=tiles_wizards).solve()
+    assert len(solution.assignments) == 9
+    assert check_solution(solution)
+
+def test_game_solve_default_python(tiles_wizards, monkeypatch):
+    # the compiled core lacks the Python search's pruning, so it is opt-in
+    def solve_compiled(game):
+        raise AssertionError('compiled core used by default')
+    monkeypatch.setattr(Game, '_solve_compiled', solve_compiled)
+    assert check_solution(Game(tiles=tiles_wizards).solve())
+
+@pytest.mark.parametrize('use_numba', [True, False])
+def test_game_solve_all(tiles_wizards, use_numba, monkeypatch):
+    monkeypatch.setattr(Globals, 'USE_NUMBA', use_numba)
+    monkeypatch.setattr(Globals, 'FIRST_ONLY', False)
+    solutions = Game(tiles=tiles_wizards).solve()
+    # one solution, seen in each of the 4 rotations of the whole board
+    assert len(solutions) == 4
+    assert all(check_solution(solution) for solution in solutions)
+    assert len(distinct_solutions(solutions)) == 4
+
+@pytest.mark.parametrize('first_only', [True, False])
+def test_game_solve_fewer_tiles(tiles_wizards, first_only, monkeypatch):
+    # with fewer tiles than locs, a solution leaves some locs empty
+    monkeypatch.setattr(Globals, 'USE_RARES', False)
+    monkeypatch.setattr(Globals, 'FIRST_ONLY', first_only)
+    solutions = Game(tiles=tiles_wizards[:3]).solve()
+    if first_only:
+        solutions = [solutions]
+    else:
+        assert len(solutions) == 26
+    assert all(check_solution(solution) for solution in solutions)
+    assert len(distinct_solutions(solutions)) == len(solutions)
+
+@pytest.mark.parametrize('use_numba', [True, False])
+def test_game_solve_twins(tiles_wizards, use_numba, monkeypatch):
+    monkeypatch.setattr(Globals, 'USE_NUMBA', use_numba)
+    monkeypatch.setattr(Globals, 'USE_RARES', False)
+    monkeypatch.setattr(Globals, 'FIRST_ONLY', False)
+    # a tenth tile identical to the first, but turned a quarter
+    symbols = tiles_wizards[0].symbols
+    twin = Tile(tile_id=9, symbols=symbols[1:] + symbols[:1])
+    game = Game(tiles=tiles_wizards + [twin])
+    assert game.twins[twin] == (tiles_wizards[0], twin)
+    solutions = game.solve()
+    # each solution again with the twin in place of the first tile
+    assert len(solutions) == 8
+    assert all(check_solution(solution) for solution in solutions)
+    assert len(distinct_solutions(solutions)) == 8
+
+@pytest.mark.parametrize('rows, twins', [
+        # the same tile, turned a quarter
+        (['a/T,b/T,c/T,b/B', 'b/B,a/T,b/T,c/T'], True),
+        # the same on the e and w sides only
+        (['a/T,b/T,c/T,b/B', 'c/T,b/T,a/T,b/B'], False)])
+def test_game_solve_twins_2x1(layout_2x1, rows, twins, monkeypatch):
+    monkeypatch.setattr(Globals, 'USE_RARES', False)
+    monkeypatch.setattr(Globals, 'FIRST_ONLY', False)
+    tiles = [Tile(tile_id=tile_id,
+                  symbols=[Symbol(*s.split('/')) for s in row.split(',')])
+             for tile_id, row in enumerate(rows)]
+    game = Game(layout=layout_2x1, tiles=tiles)
+    assert bool(game.twins) == twins
+    found = []
+    for use_numba in (True, False):
+        monkeypatch.setattr(Globals, 'USE_NUMBA', use_numba)
+        found.append(distinct_solutions(game.solve()))
+    assert len(found[0]) == 4
+    assert found[0] == found[1]
+
+@pytest.mark.parametrize('use_numba', [True, False])
+def test_game_solve_no_solution(layout_2x1, use_numba, monkeypatch):
+    monkeypatch.setattr(Globals, 'USE_NUMBA', use_numba)
+    monkeypatch.setattr(Globals, 'USE_RARES', False)
+    # no symbol has its other half on the other tile
+    tiles = [Tile(tile_id=0, symbols=[Symbol('a', 'T')] * 4),
+             Tile(tile_id=1, symbols=[Symbol('b', 'B')] * 4)]
+    game = Game(layout=layout_2x1, tiles=tiles)
+    assert game.solve() is None
+    monkeypatch.setattr(Globals, 'FIRST_ONLY', False)
+    assert game.solve() == []
+
+@pytest.mark.parametrize('use_numba', [True, False])
+def test_game_solve_disconnected(tiles_wizards, use_numba, monkeypatch):
+    # the compiled core needs a connected layout, so both backends fall
+    # back to the Python search, which only extends from the initial loc
+    monkeypatch.setattr(Globals, 'USE_NUMBA', use_numba)
+    monkeypatch.setattr(Globals, 'USE_RARES', False)
+    monkeypatch.setattr(Globals, 'FIRST_ONLY', False)
+    layout = Layout('2x2', {'e':(1, 0), 'w':(-1, 0)})
+    assert Game(layout=layout, tiles=tiles_wizards[:4]).solve() == []
+
+@pytest.mark.parametrize('use_numba', [True, False])
+def test_game_solve_twice(tiles_wizards, use_numba, monkeypatch):
+    monkeypatch.setattr(Globals, 'USE_NUMBA', use_numba)
+    monkeypatch.setattr(Globals, 'FIRST_ONLY', False)
+    game = Game(tiles=tiles_wizards)
+    assert len(game.solve()) == 4
+    assert len(game.solve()) == 4
+
+@pytest.mark.parametrize('first_only', [True, False])
+def test_game_solve_parallel(tiles_wizards, first_only, monkeypatch):
+    monkeypatch.setattr(Globals, 'USE_NUMBA', True)
+    monkeypatch.setattr(Globals, 'PARALLEL', True)
+    monkeypatch.setattr(Globals, 'FIRST_ONLY', first_only)
+    solutions = Game(tiles=tiles_wizards).solve()
+    if first_only:
+        solutions = [solutions]
+    else:
+        assert len(solutions) == 4
+    assert all(check_solution(solution) for solution in solutions)
+    assert len(distinct_solutions(solutions)) == len(solutions)
+
+@pytest.mark.parametrize('use_numba', [True, False])
+def test_game_solve_parallel_python(tiles_wizards, use_numba, monkeypatch):
+    # with too few tiles (or no numba) for the compiled search, a parallel
+    # solve falls back to a serial Python search, and says so
+    monkeypatch.setattr(Globals, 'USE_NUMBA', use_numba)
+    monkeypatch.setattr(Globals, 'USE_RARES', False)
+    monkeypatch.setattr(Globals, 'PARALLEL', True)
+    with pytest.warns(RuntimeWarning, match='PARALLEL'):
+        solution = Game(tiles=tiles_wizards[:3]).solve()
+    assert check_solution(solution)
+
+def test_game_solve_parallel_deterministic(tiles_wizards, monkeypatch):
+    monkeypatch.setattr(Globals, 'USE_NUMBA', True)
+    monkeypatch.setattr(Globals, 'PARALLEL', True)
+    game = Game(tiles=tiles_wizards)
+    boards = [[(a.loc, a.tile, a.rotation) for a in game.solve().assignments]
+              for _ in range(2)]
+    assert boards[0] == boards[1]
+    # the first solution in seed order, as a serial search finds it
+    monkeypatch.setattr(Globals, 'PARALLEL', False)
+    assert boards[0] == [(a.loc, a.tile, a.rotation)
+                         for a in game.solve().assignments]
+
+@pytest.mark.skipif(not scramble_squares_solver._load_numba(),
+                    reason='requires numba')
+def test_game_solve_compiled_log(tiles_wizards, capsys, monkeypatch):
+    monkeypatch.setattr(Globals, 'USE_NUMBA', True)
+    Game(tiles=tiles_wizards).solve()
+    # one line for the solution, at the depth of the last loc
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1
+    assert lines[0].startswith('search depth: 8,')
+
+@pytest.mark.skipif(not scramble_squares_solver._load_numba(),
+                    reason='requires numba')
+def test_search_seed_stop(tiles_wizards, monkeypatch):
+    game = Game(tiles=tiles_wizards)
+    _, tables = scramble_squares_solver._compile_game(
+            tiles_wizards, game.layout, game.rot_syms, game.rare_ids,
+            game.layout.locs[0])
+    search_seed = scramble_squares_solver._search_seed
+    num_seeds = tables[0].shape[0] * tables[0].shape[1]
+    seed = next(seed for seed in range(num_seeds)
+                if search_seed(tables, seed, False, True)[0])
+    # a worker told to stop gives up its subtree
+    stop = multiprocessing.Event()
+    stop.set()
+    monkeypatch.setattr(scramble_squares_solver, '_stop_event', stop)
+    assert search_seed(tables, seed, False, True)[0] == []
+
+def test_game_solve_no_revisits(tiles_wizards, monkeypatch):
+    # every partial Board the search builds is built only once
+    monkeypatch.setattr(Globals, 'USE_NUMBA', False)
+    boards = []
+    push = Board.push
+    def recording_push(board, assignment):
+        push(board, assignment)
+        boards.append(frozenset((a.loc, a.tile, a.rotation)
+                                for a in board.assignments))
+    monkeypatch.setattr(Board, 'push', recording_push)
+    assert check_solution(Game(tiles=tiles_wizards).solve())
+    assert len(boards) == len(set(boards))
+
+def test_board_extend_board(tiles_wizards, monkeypatch):
+    # only check edge matches, not rare symbols on the outer edges
+    monkeypatch.setattr(Globals, 'USE_RARES', False)
+    game = Game(tiles=tiles_wizards)
+    loc = next(iter(game.layout.locs))
+    board = Board(game, [Assignment(loc=loc, tile=tiles_wizards[0],
+                                    rotation=0)])
+    candidates = list(board.extend_board())
+    assert candidates
+    # all candidates fill the same (most constrained) loc
+    assert len({a.loc for a in candidates}) == 1
+    assert all(a.tile is not tiles_wizards[0] for a in candidates)
+    for assignment in candidates:
+        board.push(assignment)
+        assert board.validate()
+        board.pop()
 
+def test_board_select_next_loc(tiles_wizards):
+    game = Game(tiles=tiles_wizards)
+    board = Board(game, [])
+    assert board._select_next_loc() == (None, 0)
+    loc = next(iter(game.layout.locs))
+    board.push(Assignment(loc=loc, tile=tiles_wizards[0], rotation=0))
+    next_loc, bits = board._select_next_loc()
+    assert next_loc in loc.dests
+    # no other open loc has fewer placements
+    counts = [len(board.get_placements(open_loc)) for open_loc in loc.dests
+              if open_loc is not None]
+    assert bin(bits).count('1') == min(counts)